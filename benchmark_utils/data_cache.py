@@ -0,0 +1,58 @@
+from benchopt import safe_import_context
+
+with safe_import_context() as import_ctx:
+    import os
+    import pathlib
+    import numpy as np
+
+
+# Directory of the on-disk cache of the datasets, which can be overridden with
+# the environment variable below.
+DATA_CACHE_VAR = "SPARSE_SUPPORT_RECOVERY_DATA_CACHE"
+
+
+def get_data_cache_dir():
+    path = os.environ.get(DATA_CACHE_VAR)
+    if path is None:
+        path = pathlib.Path.home().joinpath(
+            ".cache", "benchmark_sparse_support_recovery"
+        )
+    return pathlib.Path(path)
+
+
+def load_arrays(name, key, mmap_mode=None):
+    """Returns the dict of arrays cached under name and key, or None if they
+    are not in the cache."""
+    path = get_data_cache_dir().joinpath(name, key)
+    if not path.joinpath("complete").exists():
+        return None
+    return {
+        f.stem: np.load(f, mmap_mode=mmap_mode) for f in path.glob("*.npy")
+    }
+
+
+def open_memmap(name, key, array_name, shape, dtype=np.float64):
+    """Creates an array in the cache under name and key, to be filled through
+    a memory map. The entry is only complete, and thus loaded by
+    `load_arrays`, once `save_arrays` has been called on it."""
+    path = get_data_cache_dir().joinpath(name, key)
+    path.mkdir(parents=True, exist_ok=True)
+    return np.lib.format.open_memmap(
+        path.joinpath(f"{array_name}.npy"), mode="w+", dtype=dtype,
+        shape=shape,
+    )
+
+
+def save_arrays(name, key, **arrays):
+    """Stores arrays in the cache under name and key, with one uncompressed
+    `.npy` file per array such that they can be memory-mapped."""
+    path = get_data_cache_dir().joinpath(name, key)
+    path.mkdir(parents=True, exist_ok=True)
+    for array_name, array in arrays.items():
+        # Arrays are written under a temporary name and then renamed, such
+        # that concurrent runs never read a partially written file.
+        tmp_file = path.joinpath(f"{array_name}.{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_file, path.joinpath(f"{array_name}.npy"))
+    path.joinpath("complete").touch()
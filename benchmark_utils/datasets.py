@@ -1,4 +1,5 @@
 import numpy as np
+from scipy.signal import lfilter
 
 
 def generate_sources(n, k, random_state=None):
@@ -7,3 +8,51 @@ def generate_sources(n, k, random_state=None):
     w_true[rng.choice(n, n - k, replace=False)] = 0.0
 
     return w_true
+
+
+def fill_correlated_data(X, density, rho, snr, random_state, chunk_size):
+    """Fills X in place, e.g. a memory-mapped array, with the design of
+    `benchopt.datasets.simulated.make_correlated_data` and returns y and
+    w_true.
+
+    Each row of X is an auto-regressive process along the features, with
+    correlation rho between successive features, drawn from its own random
+    stream. X is thus generated by chunks of chunk_size rows and it only
+    depends on random_state, whatever the chunk size, as does y up to rounding
+    errors. y is accumulated chunk by chunk such that X is never held in
+    memory.
+    """
+    n_samples, n_features = X.shape
+    seed_w, seed_noise, seed_rows = np.random.SeedSequence(
+        random_state
+    ).spawn(3)
+    seed_rows = seed_rows.spawn(n_samples)
+
+    rng = np.random.default_rng(seed_w)
+    nnz = int(density * n_features)
+    support = np.sort(rng.choice(n_features, nnz, replace=False))
+    w_true = np.zeros(n_features)
+    w_true[support] = rng.standard_normal(nnz)
+
+    # X[:, j + 1] = rho * X[:, j] + sigma * eps_j with unit-variance entries,
+    # which is a first-order recursive filter of the innovations.
+    sigma = np.sqrt(1 - rho * rho)
+    y = np.empty(n_samples)
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        E = np.stack([
+            np.random.default_rng(seed).standard_normal(n_features)
+            for seed in seed_rows[start:stop]
+        ])
+        E[:, 0] /= sigma
+        X_chunk = lfilter([sigma], [1.0, -rho], E, axis=1)
+        X[start:stop] = X_chunk
+        y[start:stop] = X_chunk[:, support] @ w_true[support]
+
+    noise = np.random.default_rng(seed_noise).standard_normal(n_samples)
+    if snr not in [0, np.inf]:
+        y += noise / np.linalg.norm(noise) * np.linalg.norm(y) / snr
+    elif snr == 0:
+        y = noise
+
+    return y, w_true
@@ -0,0 +1,160 @@
+from benchopt import safe_import_context
+
+with safe_import_context() as import_ctx:
+    import numpy as np
+    from collections import OrderedDict
+    from scipy import sparse
+    from scipy.sparse.linalg import LinearOperator
+    from scipy.linalg import cholesky, lstsq, solve_triangular, LinAlgError
+    from benchmark_utils.hashing import fingerprint
+
+
+class Debiaser:
+    """Least-squares refitting of y on the columns of X in the support of w.
+
+    Along a grid of sparsity levels, consecutive supports are usually nested
+    or differ by a few columns. The engine therefore keeps a Cholesky factor R
+    of X_S.T @ X_S for the last support S and updates it when columns enter or
+    leave the support. The refitted coefficients are also memoized by
+    support. Supports for which X_S is (numerically) rank deficient are solved
+    with `scipy.linalg.lstsq`, which returns the minimum-norm solution. X can
+    be a sparse matrix or a matrix-free operator, in which case only the
+    columns in the supports are formed as dense arrays.
+    """
+
+    def __init__(self, X, y, cache_size=256, tol=1e-10):
+        self.X = X
+        self.y = y
+        self.Xty = X.T @ y
+        self.cache_size = cache_size
+        self.tol = tol
+        self.cache = OrderedDict()
+        self.cols = np.empty(0, dtype=int)
+        self.R = np.empty((0, 0))
+
+    def columns(self, s):
+        # Dense copy of the columns s of X.
+        if isinstance(self.X, LinearOperator):
+            E = np.zeros((self.X.shape[1], len(s)))
+            E[s, np.arange(len(s))] = 1.0
+            return self.X @ E
+        XS = self.X[:, s]
+        return XS.toarray() if sparse.issparse(XS) else XS
+
+    def debias(self, w):
+        """Return a copy of w where the non-zero entries are replaced by the
+        least-squares solution restricted to the support of w."""
+        w = np.copy(w)
+        s = np.flatnonzero(w)
+        if s.size > 0:
+            w[s] = self.solve(s)
+        return w
+
+    def solve(self, s):
+        """Least-squares coefficients of y on the sorted columns s of X."""
+        key = s.tobytes()
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if s.size <= self.X.shape[0] and self.update_factor(s):
+            coefs = self.solve_factor()
+        else:
+            coefs = lstsq(self.columns(s), self.y)[0]
+        self.cache[key] = coefs
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return coefs
+
+    def solve_factor(self):
+        # Semi-normal equations R.T @ R @ c = X_S.T @ y, followed by one step
+        # of iterative refinement to recover the accuracy of a QR solve.
+        XS = self.columns(self.cols)
+        c = self.solve_normal(self.Xty[self.cols])
+        c += self.solve_normal(XS.T @ (self.y - XS @ c))
+        return c[np.argsort(self.cols)]
+
+    def solve_normal(self, b):
+        z = solve_triangular(self.R, b, trans="T")
+        return solve_triangular(self.R, z)
+
+    def update_factor(self, s):
+        # Move the factorization from the current support to s. Return False
+        # if a column of s is linearly dependent on the other ones. When the
+        # support changes too much, a fresh factorization is cheaper than the
+        # column-by-column updates.
+        drop = np.flatnonzero(~np.isin(self.cols, s))
+        add = np.setdiff1d(s, self.cols)
+        if 8 * (drop.size + add.size) > s.size:
+            return self.factorize(s)
+        for p in drop[::-1]:
+            self.delete_column(p)
+        for j in add:
+            if not self.insert_column(j):
+                return False
+        return True
+
+    def factorize(self, s):
+        XS = self.columns(s)
+        G = XS.T @ XS
+        try:
+            R = cholesky(G)
+        except LinAlgError:
+            R = None
+        if R is None or np.any(np.diag(R) ** 2 <= self.tol * np.diag(G)):
+            self.cols = np.empty(0, dtype=int)
+            self.R = np.empty((0, 0))
+            return False
+        self.cols = np.copy(s)
+        self.R = R
+        return True
+
+    def insert_column(self, j):
+        x = self.columns([j])[:, 0]
+        xx = x @ x
+        k = self.cols.size
+        if k > 0:
+            XS = self.columns(self.cols)
+            r = solve_triangular(self.R, XS.T @ x, trans="T")
+            rho2 = xx - r @ r
+        else:
+            r = np.empty(0)
+            rho2 = xx
+        if rho2 <= self.tol * xx or xx == 0.0:
+            return False
+        R = np.zeros((k + 1, k + 1))
+        R[:k, :k] = self.R
+        R[:k, k] = r
+        R[k, k] = np.sqrt(rho2)
+        self.R = R
+        self.cols = np.append(self.cols, j)
+        return True
+
+    def delete_column(self, p):
+        # Removing the column p leaves an upper Hessenberg matrix which is
+        # brought back to triangular form with Givens rotations.
+        R = np.delete(self.R, p, axis=1)
+        for j in range(p, R.shape[1]):
+            a, b = R[j, j], R[j + 1, j]
+            h = np.hypot(a, b)
+            c, s = a / h, b / h
+            Rj, Rj1 = R[j, j:].copy(), R[j + 1, j:].copy()
+            R[j, j:] = c * Rj + s * Rj1
+            R[j + 1, j:] = c * Rj1 - s * Rj
+        self.R = R[:-1]
+        self.cols = np.delete(self.cols, p)
+
+
+_debiasers = OrderedDict()
+
+
+def get_debiaser(X, y, max_datasets=2):
+    """Return the debiasing engine of (X, y), shared by all the solvers and
+    parameter variants run on the same data."""
+    key = fingerprint(X, y)
+    if key in _debiasers:
+        _debiasers.move_to_end(key)
+    else:
+        _debiasers[key] = Debiaser(X, y)
+        if len(_debiasers) > max_datasets:
+            _debiasers.popitem(last=False)
+    return _debiasers[key]
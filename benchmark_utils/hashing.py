@@ -0,0 +1,33 @@
+from benchopt import safe_import_context
+
+with safe_import_context() as import_ctx:
+    import hashlib
+    import numpy as np
+    from scipy import sparse
+    from scipy.sparse.linalg import LinearOperator
+
+
+def fingerprint(*parts):
+    """Content hash of a sequence of arrays, used to identify a dataset across
+    solvers and runs. Dense and sparse arrays are supported, as well as
+    matrix-free operators through the arrays in their `args`, and None entries
+    are allowed. Other parts, such as the parameters of a generated dataset,
+    are hashed through their representation."""
+    h = hashlib.sha1()
+    for a in parts:
+        if a is None:
+            h.update(b"none")
+        elif isinstance(a, LinearOperator):
+            h.update(f"{type(a).__name__}{a.shape}{a.dtype}".encode())
+            h.update(fingerprint(*a.args).encode())
+        elif sparse.issparse(a):
+            a = a.tocsc()
+            h.update(f"sparse{a.shape}{a.dtype}".encode())
+            for b in (a.data, a.indices, a.indptr):
+                h.update(np.ascontiguousarray(b).data)
+        elif isinstance(a, np.ndarray):
+            h.update(f"dense{a.shape}{a.dtype}".encode())
+            h.update(np.ascontiguousarray(a).data)
+        else:
+            h.update(f"repr{a!r}".encode())
+    return h.hexdigest()
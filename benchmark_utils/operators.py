@@ -0,0 +1,60 @@
+from benchopt import safe_import_context
+
+with safe_import_context() as import_ctx:
+    import numpy as np
+    from scipy import sparse
+    from scipy.signal import oaconvolve
+    from scipy.sparse.linalg import LinearOperator
+
+
+class ConvolutionOperator(LinearOperator):
+    """Matrix-free operator of the full discrete convolution of a signal of
+    size n with the impulse response h, of shape (n + h.size - 1, n).
+
+    The forward and adjoint products are computed with overlap-add FFTs, in
+    O(n log h.size) operations instead of O(n h.size) for the banded matrix
+    and O(n^2) for the dense one. The explicit matrix can still be built with
+    `tocsc` or `toarray` for the solvers that need it.
+    """
+
+    def __init__(self, h, n):
+        self.h = np.asarray(h, dtype=float)
+        super().__init__(dtype=self.h.dtype, shape=(n + self.h.size - 1, n))
+        self.args = (self.h,)
+
+    def _matvec(self, w):
+        return oaconvolve(np.ravel(w), self.h, mode="full")
+
+    def _rmatvec(self, r):
+        return oaconvolve(np.ravel(r), self.h[::-1], mode="valid")
+
+    def _matmat(self, W):
+        return oaconvolve(W, self.h[:, None], mode="full", axes=0)
+
+    def _rmatmat(self, R):
+        return oaconvolve(R, self.h[::-1, None], mode="valid", axes=0)
+
+    def tocsc(self):
+        m, n = self.shape
+        size = self.h.size
+        indices = (np.arange(n)[:, None] + np.arange(size)).ravel()
+        indptr = np.arange(0, size * n + 1, size)
+        return sparse.csc_matrix(
+            (np.tile(self.h, n), indices, indptr), shape=(m, n)
+        )
+
+    def toarray(self):
+        return self.tocsc().toarray()
+
+
+def as_matrix(X, accept_sparse=False):
+    """Explicit matrix of X, for the solvers which cannot work with a
+    matrix-free operator. A sparse matrix is returned when it is accepted and
+    available."""
+    if not isinstance(X, LinearOperator):
+        return X
+    if accept_sparse and hasattr(X, "tocsc"):
+        return X.tocsc()
+    if hasattr(X, "toarray"):
+        return X.toarray()
+    return X @ np.eye(X.shape[1])
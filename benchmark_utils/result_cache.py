@@ -0,0 +1,233 @@
+from benchopt import safe_import_context
+
+with safe_import_context() as import_ctx:
+    import os
+    import inspect
+    import functools
+    import hashlib
+    from pathlib import Path
+    import numpy as np
+    from scipy import sparse
+    from benchmark_utils.hashing import fingerprint
+
+
+# The cache is enabled by setting the environment variable below to the cache
+# directory. Its size is bounded by the second one, in megabytes.
+CACHE_DIR_VAR = "SPARSE_SUPPORT_RECOVERY_CACHE"
+CACHE_SIZE_VAR = "SPARSE_SUPPORT_RECOVERY_CACHE_SIZE"
+
+
+class ResultCache:
+    """On-disk cache of solver results.
+
+    The results are addressed by a hash of the problem data, the solver name,
+    the source of its module, its parameters and the target sparsity k. The
+    solutions are stored in sparse form in uncompressed `.npz` files, along
+    with the other entries of the result and the solver state they depend
+    on. When the cache exceeds `max_size` bytes, the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, path, max_size=2 ** 30):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+
+    def key(self, data_key, name, version, parameters, k):
+        h = hashlib.sha1(data_key.encode())
+        h.update(name.encode())
+        h.update(version.encode())
+        h.update(repr(sorted(parameters.items())).encode())
+        h.update(repr(k).encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        filename = self.path / f"{key}.npz"
+        try:
+            with np.load(filename) as f:
+                result, state = self.decode(f)
+        except (OSError, ValueError, KeyError):
+            return None, None
+        # Reading an entry marks it as recently used.
+        os.utime(filename)
+        return result, state
+
+    def put(self, key, result, state=None):
+        # The file is written under a temporary name and then renamed, such
+        # that concurrent runs never read a partially written entry.
+        filename = self.path / f"{key}.npz"
+        tmp_filename = self.path / f"{key}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_filename, **self.encode(result, state))
+        os.replace(tmp_filename, filename)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for filename in self.path.glob("*.npz"):
+            try:
+                stat = filename.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        size = sum(entry[1] for entry in entries)
+        for _, file_size, filename in sorted(entries):
+            if size <= self.max_size:
+                break
+            filename.unlink(missing_ok=True)
+            size -= file_size
+
+    @staticmethod
+    def encode(result, state=None):
+        # The solution w, either a vector or a stack of solutions, is stored
+        # as a CSC matrix with one column per solution.
+        w = result["w"]
+        w_ndim = 2 if sparse.issparse(w) else np.ndim(w)
+        w = sparse.csc_matrix(w if w_ndim == 2 else np.reshape(w, (-1, 1)))
+        arrays = dict(
+            w_data=w.data,
+            w_indices=w.indices.astype(np.int32),
+            w_indptr=w.indptr.astype(np.int64),
+            w_shape=np.array(w.shape),
+            w_ndim=np.array(w_ndim),
+        )
+        for key, val in result.items():
+            if key != "w":
+                ResultCache.encode_value(arrays, f"info_{key}", val)
+        for key, val in (state or {}).items():
+            if val is not None:
+                ResultCache.encode_value(arrays, f"state_{key}", val)
+        return arrays
+
+    @staticmethod
+    def encode_value(arrays, name, val):
+        # The kind of each value is stored along with it, such that it is
+        # decoded with the type returned by the solver.
+        if isinstance(val, (list, tuple)) and any(
+            np.ndim(v) > 0 for v in val
+        ):
+            # One array per solution, of possibly different sizes, such as
+            # the traces of a path of solutions.
+            arrays[name] = np.concatenate([np.ravel(v) for v in val])
+            arrays[f"sizes_{name}"] = np.array([np.size(v) for v in val])
+            kind = f"ragged_{type(val).__name__}"
+        else:
+            arrays[name] = np.asarray(val)
+            if isinstance(val, list):
+                kind = "list"
+            elif isinstance(val, tuple):
+                kind = "tuple"
+            elif isinstance(val, np.ndarray):
+                kind = "ndarray"
+            elif isinstance(val, np.generic):
+                kind = "numpy"
+            else:
+                kind = "python"
+        arrays[f"kind_{name}"] = np.array(kind)
+
+    @staticmethod
+    def decode_value(arrays, name):
+        val = arrays[name]
+        kind = str(arrays[f"kind_{name}"])
+        if kind.startswith("ragged_"):
+            sizes = arrays[f"sizes_{name}"]
+            val = np.split(val, np.cumsum(sizes)[:-1])
+            return tuple(val) if kind == "ragged_tuple" else val
+        elif kind == "list":
+            return val.tolist()
+        elif kind == "tuple":
+            return tuple(val.tolist())
+        elif kind == "ndarray":
+            return val
+        elif kind == "numpy":
+            return val[()]
+        return val.item()
+
+    @staticmethod
+    def decode(arrays):
+        w = sparse.csc_matrix(
+            (arrays["w_data"], arrays["w_indices"], arrays["w_indptr"]),
+            shape=tuple(arrays["w_shape"]),
+        ).toarray()
+        result = dict(w=w if arrays["w_ndim"] == 2 else w.ravel())
+        state = {}
+        for name in arrays.files:
+            if name.startswith("info_"):
+                result[name[len("info_"):]] = ResultCache.decode_value(
+                    arrays, name
+                )
+            elif name.startswith("state_"):
+                state[name[len("state_"):]] = ResultCache.decode_value(
+                    arrays, name
+                )
+        return result, state
+
+
+_result_cache = {}
+
+
+def get_result_cache():
+    """Returns the result cache set through the environment, if any."""
+    path = os.environ.get(CACHE_DIR_VAR)
+    if not path:
+        return None
+    if path not in _result_cache:
+        max_size = float(os.environ.get(CACHE_SIZE_VAR, 1024)) * 2 ** 20
+        _result_cache[path] = ResultCache(path, max_size=max_size)
+    return _result_cache[path]
+
+
+_solver_versions = {}
+
+
+def get_solver_version(solver_class):
+    """Hash of the source file of a solver class, such that the cached
+    results are invalidated whenever the solver code changes."""
+    if solver_class not in _solver_versions:
+        with open(inspect.getfile(solver_class), "rb") as f:
+            _solver_versions[solver_class] = hashlib.sha1(f.read()).hexdigest()
+    return _solver_versions[solver_class]
+
+
+def cached_run(run):
+    """Decorator for the `run` method of the solvers which serves the result
+    from the on-disk cache when the same solver, with the same code and
+    parameters, has already been run for the same k on the same data.
+
+    On a cache hit, the entries of the cached result are set as attributes of
+    the solver, which is how the solvers build their result in `get_result`.
+    The solvers whose runs depend on the previous ones, through a warm start
+    or a search history, list the attributes holding this state in
+    `cache_state`. They are stored with the result and restored on a hit, such
+    that the next runs follow the same chain as without the cache. The other
+    solvers must not carry any state across runs that changes their results.
+    """
+
+    @functools.wraps(run)
+    def wrapper(self, k):
+        cache = get_result_cache()
+        if cache is None:
+            return run(self, k)
+        # The data fingerprint is computed once per problem.
+        data_id = (id(self.X), id(self.y))
+        if getattr(self, "_data_key", (None,))[0] != data_id:
+            self._data_key = (data_id, fingerprint(self.X, self.y))
+        key = cache.key(
+            self._data_key[1],
+            self.name,
+            get_solver_version(type(self)),
+            getattr(self, "_parameters", {}),
+            k,
+        )
+        result, state = cache.get(key)
+        if result is None:
+            run(self, k)
+            state = {
+                attr: getattr(self, attr)
+                for attr in getattr(self, "cache_state", ())
+            }
+            cache.put(key, self.get_result(), state)
+        else:
+            for attr, val in {**result, **state}.items():
+                setattr(self, attr, val)
+
+    return wrapper
@@ -6,32 +6,139 @@ with safe_import_context() as import_ctx:
 
 
 class RunOnGridCriterion(StoppingCriterion):
+    """Runs the solver for each sparsity level of a grid.
+
+    The grid is either made of fractions of non-zero entries (`grid_type` set
+    to "fraction") or of absolute numbers of non-zero entries (`grid_type` set
+    to "k"). The solvers are run on the sorted integer values of k, without
+    duplicates, such that the fractions leading to the same k are only run
+    once. With `path=True`, the solver is given the tuple of all the values
+    of k at once and is expected to return one solution per value. Each row
+    of the results then reports its own k as `stop_val`, while its `time` is
+    the one of the whole path.
+
+    With a positive `refine_budget`, up to `refine_budget` values of k are
+    added once the grid has been run. Each of them is inserted in the middle
+    of the interval between two consecutive values of k where the monitored
+    metric `refine_key` changes most, such that the points concentrate where
+    the support recovery curve has its transition. Once the runs are done,
+    the rows of the results are sorted by k, the refined values being run
+    last.
+
+    No key is monitored by default: the values of k are not iterations of
+    the solver, so benchopt's checks for a diverging or flat objective do
+    not apply to them.
+    """
+
     def __init__(
         self,
         grid=np.linspace(0, 1, 10),
+        grid_type="fraction",
+        path=False,
+        refine_budget=0,
+        refine_key="f1score",
         strategy="iteration",
-        key_to_monitor="objective_value",
+        key_to_monitor=None,
         **kwargs,
     ):
         super().__init__(strategy=strategy, key_to_monitor=key_to_monitor)
+        if grid_type not in ["fraction", "k"]:
+            raise ValueError(f"Unknown grid_type {grid_type}")
+        if path and refine_budget > 0:
+            raise ValueError("The grid cannot be refined in path mode")
         self.grid = grid
+        self.grid_type = grid_type
+        self.path = path
+        self.refine_budget = refine_budget
+        self.refine_key = refine_key
         self.grid_idx = 0
 
+    def k_grid(self, n_features):
+        """Sorted values of k without duplicates for a problem with
+        n_features features."""
+        grid = np.asarray(self.grid)
+        if self.grid_type == "fraction":
+            grid = np.floor(grid * n_features)
+        grid = np.clip(grid.astype(int), 0, n_features)
+        return np.unique(grid)
+
     def get_runner_instance(
-        self, max_runs=1, timeout=None, output=None, solver=None
+        self, max_runs=1, timeout=None, solver=None, **kwargs
     ):
-        self.kwargs["grid"] = self.grid
+        # The runner instance works directly on the values of k, which can
+        # only be computed once the solver knows the problem dimension.
+        if solver is None or not hasattr(solver, "X"):
+            raise ValueError(
+                "RunOnGridCriterion requires the solver to store the design "
+                "matrix in its X attribute in set_objective"
+            )
+        self.kwargs["grid"] = self.k_grid(solver.X.shape[1])
+        self.kwargs["grid_type"] = "k"
+        self.kwargs["path"] = self.path
+        self.kwargs["refine_budget"] = self.refine_budget
+        self.kwargs["refine_key"] = self.refine_key
         self.kwargs["grid_idx"] = self.grid_idx
-        return super().get_runner_instance(max_runs, timeout, output, solver)
+        return super().get_runner_instance(
+            max_runs=max_runs, timeout=timeout, solver=solver, **kwargs
+        )
+
+    def stop_val(self):
+        if self.path:
+            return tuple(int(k) for k in self.grid[self.grid_idx:])
+        return int(self.grid[self.grid_idx])
+
+    def should_stop(self, stop_val, objective_list):
+        # In path mode, the rows of all the solutions are returned with the
+        # tuple of k as stop_val. Each of them is given its own k instead,
+        # such that the results can be plotted against k.
+        if self.path:
+            grid = self.grid[self.grid_idx:]
+            for objective_dict, k in zip(objective_list[-len(grid):], grid):
+                objective_dict["stop_val"] = int(k)
+        stop, status, stop_val = super().should_stop(stop_val, objective_list)
+        if stop:
+            objective_list.sort(key=lambda objective_dict: (
+                objective_dict["stop_val"]
+            ))
+        return stop, status, stop_val
 
     def init_stop_val(self):
-        return self.grid[self.grid_idx]
+        return self.stop_val()
+
+    def refine(self, objective_list):
+        """Returns the value of k to insert in the grid, or None if no
+        interval between two consecutive values of k can be split."""
+        key = self.refine_key
+        if not key.startswith("objective_"):
+            key = f"objective_{key}"
+        # Without ground truth, the objective value is monitored instead.
+        if key not in objective_list[0]:
+            key = "objective_value"
+        metric = {
+            objective_dict["stop_val"]: objective_dict[key]
+            for objective_dict in objective_list
+        }
+        k_run = np.array(sorted(metric))
+        gaps = np.diff(k_run)
+        change = np.abs(np.diff([metric[k] for k in k_run]))
+        change = np.where((gaps > 1) & np.isfinite(change), change, -1.0)
+        if k_run.size < 2 or np.max(change) < 0:
+            return None
+        i = np.argmax(change)
+        return (k_run[i] + k_run[i + 1]) // 2
 
-    def check_convergence(self, _):
+    def check_convergence(self, objective_list):
+        if self.path:
+            return True, 1.0
+        if self.grid_idx >= len(self.grid) - 1 and self.refine_budget > 0:
+            k = self.refine(objective_list)
+            if k is not None:
+                self.grid = np.append(self.grid, k)
+                self.refine_budget -= 1
         stop = self.grid_idx >= len(self.grid) - 1
-        progress = (self.grid_idx + 1) / len(self.grid)
+        progress = (self.grid_idx + 1) / (len(self.grid) + self.refine_budget)
         return stop, progress
 
     def get_next_stop_val(self, _):
         self.grid_idx += 1
-        return self.grid[self.grid_idx]
+        return self.stop_val()
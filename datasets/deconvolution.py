@@ -3,6 +3,7 @@ from benchopt import BaseDataset, safe_import_context
 with safe_import_context() as import_ctx:
     import numpy as np
     import pathlib
+    from benchmark_utils.operators import ConvolutionOperator
 
 
 class Dataset(BaseDataset):
@@ -11,14 +12,30 @@ class Dataset(BaseDataset):
         "k, snr, random_state": [
             (5, 10.0, None),
         ],
+        "n_features": [100],
+        "operator": ["dense"],
     }
 
-    def get_data(self):
-        if self.random_state:
-            np.random.seed(self.random_state)
+    def get_impulse_response(self):
+        # The 21-sample impulse response is the first column of the shipped
+        # convolution matrix, which has 100 columns.
         X = np.load(
             pathlib.Path(__file__).parent.joinpath("deconvolution.npy")
         )
+        return X[:X.shape[0] - X.shape[1] + 1, 0]
+
+    def get_data(self):
+        if self.random_state:
+            np.random.seed(self.random_state)
+        # The convolution operator is either matrix-free ("fft"), a banded
+        # sparse matrix ("sparse") or a dense matrix ("dense").
+        X = ConvolutionOperator(self.get_impulse_response(), self.n_features)
+        if self.operator == "dense":
+            X = X.toarray()
+        elif self.operator == "sparse":
+            X = X.tocsc()
+        elif self.operator != "fft":
+            raise ValueError(f"Unknown operator {self.operator}")
         w_true = np.zeros(X.shape[1])
         s_true = np.random.choice(X.shape[1], self.k, replace=False)
         w_true[s_true] = np.random.randn(self.k)
@@ -17,8 +17,10 @@ class Dataset(BaseDataset):
     def get_data(self):
         if self.random_state:
             np.random.seed(self.random_state)
-        f = np.load(pathlib.Path(__file__).parent.joinpath("lattice.npz"))
-        X = f['X']
+        # The arrays are stored as uncompressed .npy files which are
+        # memory-mapped instead of being read in full.
+        path = pathlib.Path(__file__).parent.joinpath("lattice_data")
+        X = np.load(path.joinpath("X.npy"), mmap_mode="r")
         if self.semi_simulated:
             w_true = np.zeros(X.shape[1])
             s_true = np.random.choice(X.shape[1], self.k, replace=False)
@@ -29,5 +31,5 @@ class Dataset(BaseDataset):
             y += e
         else:
             w_true = None
-            y = f['y']
+            y = np.load(path.joinpath("y.npy"), mmap_mode="r")
         return dict(X=X, y=y, w_true=w_true)
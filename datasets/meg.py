@@ -6,6 +6,7 @@ with safe_import_context() as import_ctx:
     import numpy as np
     from sklearn.datasets import fetch_openml
     from benchmark_utils.datasets import generate_sources
+    from benchmark_utils.data_cache import load_arrays, save_arrays
 
 
 class Dataset(BaseDataset):
@@ -15,12 +16,36 @@ class Dataset(BaseDataset):
             (None, None, False, None),
             (0.001, 100.0, True, None),
         ],
+        "dtype": ["float64"],
     }
+    data_id = 43884
+
+    def fetch_meg_data(self):
+        # The operator and the observation are fetched from OpenML once and
+        # stored as raw `.npy` files, which are then memory-mapped such that
+        # later runs neither parse the data again nor need a network access.
+        # The float32 copy is only materialized when it is requested.
+        key = f"openml_{self.data_id}"
+        arrays = load_arrays("meg", key, mmap_mode="r")
+        if arrays is None:
+            dataset = fetch_openml(data_id=self.data_id)
+            all_data = dataset.data.to_numpy()
+            del dataset
+            save_arrays("meg", key, X=all_data[:, :7498], y=all_data[:, 7498])
+            del all_data
+            arrays = load_arrays("meg", key, mmap_mode="r")
+        X, y = arrays["X"], arrays["y"]
+        if self.dtype != "float64":
+            key = f"{key}_{self.dtype}"
+            arrays = load_arrays("meg", key, mmap_mode="r")
+            if arrays is None:
+                save_arrays("meg", key, X=X.astype(self.dtype))
+                arrays = load_arrays("meg", key, mmap_mode="r")
+            X, y = arrays["X"], y.astype(self.dtype)
+        return X, y
 
     def load_meg_data(self):
-        dataset = fetch_openml(data_id=43884)
-        all_data = dataset.data.to_numpy()
-        X = all_data[:, :7498]
+        X, y_real = self.fetch_meg_data()
         n = X.shape[1]
         if self.semi_simulated:
             w_true = generate_sources(n, int(self.k * n), self.random_state)
@@ -29,7 +54,7 @@ class Dataset(BaseDataset):
             e *= np.sqrt((y @ y) / (self.snr * (e @ e)))
             y += e
         else:
-            y = all_data[:, 7498]
+            y = np.array(y_real)
             w_true = None
 
         return X, y, w_true
@@ -2,11 +2,16 @@ from benchopt import BaseDataset
 from benchopt import safe_import_context
 
 with safe_import_context() as import_ctx:
+    import os
     import math
     import numpy as np
+    from joblib import Parallel, delayed
     import pysindy as ps
     from scipy.integrate import solve_ivp
+    from scipy import sparse
     from scipy.linalg import block_diag
+    from benchmark_utils.data_cache import load_arrays, save_arrays
+    from benchmark_utils.hashing import fingerprint
 
 
 integrator_keywords = {}
@@ -300,6 +305,25 @@ class MHD(System):
         return np.random.uniform(-1.5, 1.5, size=(n, 6))
 
 
+# Number of processes used to integrate several trajectories, which can be
+# set with the environment variable below. As an execution setting, it is not
+# a parameter of the dataset.
+N_JOBS_VAR = "SPARSE_SUPPORT_RECOVERY_N_JOBS"
+
+
+def get_n_jobs(n_tasks, default=4):
+    n_jobs = int(os.environ.get(N_JOBS_VAR, default))
+    if n_jobs < 0:
+        n_jobs = max(os.cpu_count() + 1 + n_jobs, 1)
+    return max(min(n_jobs, n_tasks), 1)
+
+
+def simulate_and_differentiate(system, duration, dt, x0):
+    t, x = system.simulate(duration, dt, x0=x0)
+    v = ps.differentiation.SmoothedFiniteDifference()._differentiate(x, t)
+    return t, x, v
+
+
 class Dataset(BaseDataset):
     """Credits to the repository https://github.com/wesg52/sindy_mio_paper and
     the PySindy package."""
@@ -314,24 +338,109 @@ class Dataset(BaseDataset):
         "noise_ratio": [0.001],
         "dt": [0.01],
         "seed": [None],
+        "n_trajectories": [1],
+        "sparse_operator": [False],
     }
     install_cmd = "pip"
     requirements = ["pysindy"]
 
+    def get_trajectories(self, system):
+        # The trajectories and their derivatives are deterministic for a given
+        # seed. They are cached on disk together with the state of the random
+        # generator after the initial conditions are sampled, such that the
+        # noise drawn afterwards is the same as without the cache.
+        key = None
+        if self.seed is not None:
+            key = fingerprint(
+                self.system, system.true_coefs, self.duration, self.dt,
+                self.seed, self.n_trajectories,
+            )
+            arrays = load_arrays("ode_trajectory", key)
+            if arrays is not None:
+                np.random.set_state((
+                    "MT19937",
+                    arrays["rng_keys"],
+                    int(arrays["rng_pos"]),
+                    int(arrays["rng_has_gauss"]),
+                    float(arrays["rng_cached_gaussian"]),
+                ))
+                return arrays["t"], arrays["x"], arrays["v"]
+
+        x0s = system.sample_initial_conditions(
+            n=self.n_trajectories, seed=self.seed
+        )
+        rng_state = np.random.get_state()
+
+        # The trajectories are integrated concurrently in a process pool.
+        n_jobs = get_n_jobs(self.n_trajectories)
+        if n_jobs > 1:
+            trajectories = Parallel(n_jobs=n_jobs)(
+                delayed(simulate_and_differentiate)(
+                    system, self.duration, self.dt, x0
+                )
+                for x0 in x0s
+            )
+        else:
+            trajectories = [
+                simulate_and_differentiate(system, self.duration, self.dt, x0)
+                for x0 in x0s
+            ]
+        t = trajectories[0][0]
+        x = np.stack([x_i for _, x_i, _ in trajectories])
+        v = np.stack([v_i for _, _, v_i in trajectories])
+
+        if key is not None:
+            _, keys, pos, has_gauss, cached_gaussian = rng_state
+            save_arrays(
+                "ode_trajectory", key, t=t, x=x, v=v, rng_keys=keys,
+                rng_pos=np.array(pos), rng_has_gauss=np.array(has_gauss),
+                rng_cached_gaussian=np.array(cached_gaussian),
+            )
+        return t, x, v
+
+    def get_library(self, system):
+        # The polynomial library of the noisy trajectories, stacked along the
+        # time axis, is also cached for a given seed along with the stacked
+        # derivatives.
+        key = None
+        if self.seed is not None:
+            key = fingerprint(
+                self.system, system.true_coefs, self.duration, self.dt,
+                self.seed, self.n_trajectories, self.degree, self.noise_ratio,
+            )
+            arrays = load_arrays("ode_library", key)
+            if arrays is not None:
+                return arrays["x_poly"], arrays["v"]
+
+        poly_lib = ps.PolynomialLibrary(degree=self.degree)
+        _, x, v = self.get_trajectories(system)
+        e = np.stack([
+            np.random.normal(0, np.linalg.norm(x_i) * self.noise_ratio,
+                             x_i.shape)
+            for x_i in x
+        ])
+        # pysindy returns an AxesArray, which scipy.sparse cannot handle.
+        x_poly = np.asarray(poly_lib.fit_transform(np.concatenate(x + e)))
+        v = np.concatenate(v)
+
+        if key is not None:
+            save_arrays("ode_library", key, x_poly=x_poly, v=v)
+        return x_poly, v
+
     def get_data(self):
         dim = get_system_dim(self.system)
         system_type = eval(self.system)
         system = system_type(library_size=get_polylib_size(self.degree, dim))
-        poly_lib = ps.PolynomialLibrary(degree=self.degree)
-        diff_method = ps.differentiation.SmoothedFiniteDifference()
 
-        x0 = system.sample_initial_conditions(n=1, seed=self.seed)[0]
-        t, x = system.simulate(self.duration, self.dt, x0=x0)
-        v = diff_method._differentiate(x, t)
-        e = np.random.normal(0, np.linalg.norm(x) * self.noise_ratio, x.shape)
-        x_poly = poly_lib.fit_transform(x + e)
+        x_poly, v = self.get_library(system)
 
-        X = block_diag(*(x_poly for _ in range(dim)))
+        # Each equation of the system is regressed on the same library, so X
+        # is block-diagonal. It can be returned as a sparse matrix, which only
+        # stores the dim blocks.
+        if self.sparse_operator:
+            X = sparse.block_diag([x_poly] * dim, format="csc")
+        else:
+            X = block_diag(*(x_poly for _ in range(dim)))
         y = v.T.flatten()
         w_true = system.true_coefs.flatten()
 
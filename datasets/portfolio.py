@@ -3,6 +3,9 @@ from benchopt import BaseDataset, safe_import_context
 with safe_import_context() as import_ctx:
     import numpy as np
     import pathlib
+    from scipy.linalg import cholesky, solve_triangular
+    from benchmark_utils.data_cache import load_arrays, save_arrays
+    from benchmark_utils.hashing import fingerprint
 
 
 class Dataset(BaseDataset):
@@ -12,10 +15,26 @@ class Dataset(BaseDataset):
         "ratio": [0.25, 0.5, 0.75],
     }
 
+    def get_factor(self):
+        # With S = R.T @ R, the problem for a given ratio r is X = sqrt(r) R
+        # and y solving X.T @ y = (1 - r) p, i.e. y = (1 - r) / sqrt(r) z
+        # with R.T @ z = p. R and z are thus computed once per instance and
+        # cached on disk, such that all the ratios only rescale them.
+        path = pathlib.Path(__file__).parent.joinpath("portfolio_data")
+        S = np.load(path.joinpath(f"S{self.instance}.npy"), mmap_mode="r")
+        p = np.load(path.joinpath(f"p{self.instance}.npy"), mmap_mode="r")
+        key = fingerprint(S, p)
+        arrays = load_arrays("portfolio", key, mmap_mode="r")
+        if arrays is None:
+            R = cholesky(S)
+            z = solve_triangular(R, p, trans="T")
+            save_arrays("portfolio", key, R=R, z=z)
+            arrays = load_arrays("portfolio", key, mmap_mode="r")
+        return arrays["R"], arrays["z"]
+
     def get_data(self):
-        f = np.load(pathlib.Path(__file__).parent.joinpath("portfolio.npz"))
-        S = f["S" + self.instance]
-        p = f["p" + self.instance]
-        X = np.linalg.cholesky(self.ratio * S).T
-        y = np.linalg.lstsq(X.T, (1.0 - self.ratio) * p, rcond=None)[0]
+        R, z = self.get_factor()
+        scale = np.sqrt(self.ratio)
+        X = scale * R
+        y = ((1.0 - self.ratio) / scale) * z
         return dict(X=X, y=y, w_true=None)
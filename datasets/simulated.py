@@ -1,6 +1,15 @@
-from benchopt import BaseDataset
+from benchopt import BaseDataset, safe_import_context
 from benchopt.datasets.simulated import make_correlated_data
 
+with safe_import_context() as import_ctx:
+    from benchmark_utils.datasets import fill_correlated_data
+    from benchmark_utils.data_cache import (
+        load_arrays,
+        open_memmap,
+        save_arrays,
+    )
+    from benchmark_utils.hashing import fingerprint
+
 
 class Dataset(BaseDataset):
     name = "simulated"
@@ -8,9 +17,40 @@ class Dataset(BaseDataset):
         "n_samples, n_features, density, rho, snr, random_state": [
             (30, 50, 0.1, 0.9, 10.0, None),
         ],
+        "chunk_size": [None],
     }
 
+    def get_large_scale_data(self):
+        # X is generated by chunks of rows into a memory-mapped file of the
+        # data cache. As it is deterministic given the random state, it is
+        # generated once and memory-mapped by the later runs.
+        if self.random_state is None:
+            raise ValueError(
+                "The chunked generation requires an integer random_state"
+            )
+        key = fingerprint(
+            self.n_samples, self.n_features, self.density, self.rho,
+            self.snr, self.random_state,
+        )
+        arrays = load_arrays("simulated", key, mmap_mode="r")
+        if arrays is None:
+            X = open_memmap(
+                "simulated", key, "X", (self.n_samples, self.n_features)
+            )
+            y, w_true = fill_correlated_data(
+                X, self.density, self.rho, self.snr, self.random_state,
+                self.chunk_size,
+            )
+            X.flush()
+            del X
+            save_arrays("simulated", key, y=y, w_true=w_true)
+            arrays = load_arrays("simulated", key, mmap_mode="r")
+        return arrays["X"], arrays["y"], arrays["w_true"]
+
     def get_data(self):
+        if self.chunk_size is not None:
+            X, y, w_true = self.get_large_scale_data()
+            return dict(X=X, y=y, w_true=w_true)
         X, y, w_true = make_correlated_data(
             n_samples=self.n_samples,
             n_features=self.n_features,
@@ -2,16 +2,16 @@ from benchopt import BaseObjective, safe_import_context
 
 with safe_import_context() as import_ctx:
     import numpy as np
+    from scipy import sparse
+    from scipy.sparse.linalg import LinearOperator
     from benchmark_utils.metrics import (
         snr,
-        fpr,
-        fnr,
-        tpr,
-        tnr,
+        snr_columns,
+        to_dB,
         auc,
         dist_to_supp,
+        support_metrics,
     )
-    from sklearn.metrics import f1_score
 
 
 class Objective(BaseObjective):
@@ -24,40 +24,83 @@ class Objective(BaseObjective):
     install_cmd = 'conda'
     requirements = ['scikit-learn']
 
-
     def set_data(self, X, y, w_true=None):
         self.X = X
         self.y = y
         self.w_true = w_true
 
+        # Quantities that only depend on the dataset are computed once.
+        if self.w_true is not None:
+            self.Xw_true = self.X @ self.w_true
+            self.snr_y_true = snr(self.y, self.Xw_true)
+
+    def predict(self, W):
+        # X @ W, restricted to the support columns when W is sparse enough.
+        # W is either a vector or a stack of solutions, one per column.
+        if isinstance(self.X, LinearOperator):
+            return self.X @ W
+        s = np.flatnonzero(W if W.ndim == 1 else np.any(W != 0, axis=1))
+        if 2 * s.size < self.X.shape[1]:
+            return self.X[:, s] @ W[s]
+        return self.X @ W
+
     def get_one_result(self):
         return dict(w=np.zeros(self.X.shape[1]))
 
-    def evaluate_result(self, w):
+    def evaluate_result(self, w, **info):
+        # Solvers can report extra information along with w, such as their
+        # number of iterations, the optimality gap they reached or its trace
+        # over time. When the solver returns a whole path of solutions, one
+        # row of metrics is returned per solution.
+        if sparse.issparse(w) or w.ndim == 2:
+            return self.evaluate_path(w, **info)
+        info = {key: [val] for key, val in info.items()}
+        return self.evaluate_path(w[:, None], **info)[0]
+
+    def evaluate_path(self, W, **info):
+        """Evaluates a stack of solutions at once, such as a whole sparsity
+        path, with one solution per column of the 2-D array or sparse matrix
+        W. The extra information is either a scalar shared by all the
+        solutions or a sequence with one value per solution, where each value
+        can itself be an array. Returns the list of the metrics of each
+        solution."""
+        if sparse.issparse(W):
+            W = W.toarray()
+        n_sol = W.shape[1]
         metrics = {}
+        for key, val in info.items():
+            if isinstance(val, (list, tuple)) or np.ndim(val) > 0:
+                if len(val) != n_sol:
+                    raise ValueError(
+                        f"Got {len(val)} values of {key} for {n_sol} "
+                        "solutions"
+                    )
+                metrics[key] = list(val)
+            else:
+                metrics[key] = [val] * n_sol
 
-        r = self.y - self.X @ w
-        metrics["value"] = ((r @ r) / r.size)
-        metrics["n_nnz"] = np.sum(w != 0)
-        metrics["snr_y"] = snr(self.y, self.X @ w)
-        metrics["snr_y_dB"] = snr(self.y, self.X @ w, dB=True)
+        R = self.y[:, None] - self.predict(W)
+        metrics["value"] = np.sum(R ** 2, axis=0) / R.shape[0]
+        metrics["n_nnz"] = np.count_nonzero(W, axis=0)
+        metrics["snr_y"] = snr_columns(self.y, self.y[:, None] - R)
+        metrics["snr_y_dB"] = to_dB(metrics["snr_y"])
 
         if self.w_true is not None:
-            metrics["snr_y_true"] = snr(self.y, self.X @ self.w_true)
-            metrics["snr_y_true_dB"] = snr(
-                self.y, self.X @ self.w_true, dB=True
-            )
-            metrics["snr_w"] = snr(self.w_true, w)
-            metrics["snr_w_dB"] = snr(self.w_true, w, dB=True)
-            metrics["tpr"] = tpr(self.w_true, w)
-            metrics["fpr"] = fpr(self.w_true, w)
-            metrics["tnr"] = tnr(self.w_true, w)
-            metrics["fnr"] = fnr(self.w_true, w)
-            metrics["f1score"] = f1_score(self.w_true != 0, w != 0)
-            metrics["auc"] = auc(self.w_true, w)
-            metrics["dist_to_supp"] = dist_to_supp(self.w_true, w)
-
-        return metrics
+            metrics["snr_y_true"] = np.full(n_sol, self.snr_y_true)
+            metrics["snr_y_true_dB"] = to_dB(metrics["snr_y_true"])
+            metrics["snr_w"] = snr_columns(self.w_true, W)
+            metrics["snr_w_dB"] = to_dB(metrics["snr_w"])
+            metrics.update(support_metrics(self.w_true, W))
+            # The rank-based metrics are computed for each solution.
+            metrics["auc"] = [auc(self.w_true, w) for w in W.T]
+            metrics["dist_to_supp"] = [
+                dist_to_supp(self.w_true, w) for w in W.T
+            ]
+
+        return [
+            {key: val[i] for key, val in metrics.items()}
+            for i in range(n_sol)
+        ]
 
     def get_objective(self):
         return dict(X=self.X, y=self.y)
@@ -1,53 +1,220 @@
 from benchopt import BaseSolver, safe_import_context
 from benchmark_utils.stopping_criterion import RunOnGridCriterion
+from benchmark_utils.result_cache import cached_run
 
 with safe_import_context() as import_ctx:
     import numpy as np
-    from scipy.linalg import lstsq
+    from scipy import sparse
+    from scipy.sparse.linalg import svds, LinearOperator
+    from benchmark_utils.debiasing import get_debiaser
+
+
+def top_k(z, k):
+    """Indices of the k entries of z with the largest absolute value, found
+    with a linear-time partial selection instead of a full sort."""
+    if k <= 0:
+        return np.empty(0, dtype=int)
+    if k >= z.size:
+        return np.arange(z.size)
+    return np.argpartition(np.abs(z), z.size - k)[z.size - k:]
 
 
 class Solver(BaseSolver):
     name = "iht"
     stopping_criterion = RunOnGridCriterion(grid=np.linspace(0, 0.1, 10))
     parameters = {
+        "variant": ["iht"],
         "maxit": [1_000],
         "rel_tol": [1e-8],
+        "gram": ["auto"],
         "debiasing_step": [False, True],
     }
 
+    # Backtracking constants of the normalized IHT step size, see Blumensath
+    # and Davies, "Normalized Iterative Hard Thresholding: Guaranteed
+    # Stability and Performance", 2010.
+    niht_c = 0.01
+    niht_kappa = 2.0
+
     def set_objective(self, X, y):
         self.X = X
         self.y = y
-        self.L = np.linalg.norm(self.X, ord=2) ** 2
+        self.matrix_free = isinstance(self.X, LinearOperator)
+        if sparse.issparse(self.X) or self.matrix_free:
+            self.L = svds(self.X, k=1, return_singular_vectors=False)[0] ** 2
+        else:
+            self.L = np.linalg.norm(self.X, ord=2) ** 2
+
+        # In Gram mode, the iterations only involve X.T @ X and X.T @ y which
+        # are computed once. This is cheaper when n_samples >= n_features,
+        # except for matrix-free operators whose products are cheap.
+        # The gram parameter is a string when it is set from the command line.
+        if str(self.gram) not in ["auto", "True", "False"]:
+            raise ValueError(f"Unknown gram {self.gram}")
+        if self.matrix_free:
+            self.use_gram = False
+        elif str(self.gram) == "auto":
+            self.use_gram = self.X.shape[0] >= self.X.shape[1]
+        else:
+            self.use_gram = str(self.gram) == "True"
+        if self.use_gram:
+            # The Gram matrix of a sparse X is densified as it is accessed
+            # by rows at each iteration.
+            self.G = self.X.T @ self.X
+            if sparse.issparse(self.G):
+                self.G = self.G.toarray()
+            self.Xty = self.X.T @ self.y
+            self.yty = self.y @ self.y
+
+        if self.debiasing_step:
+            self.debiaser = get_debiaser(self.X, self.y)
+
+        if self.variant not in ["iht", "aiht", "niht"]:
+            raise ValueError(f"Unknown variant {self.variant}")
+
+        self.reset_path()
+
+    def reset_path(self):
+        # State of the sparsity path walked by IHT. The sparsity levels are
+        # solved by continuation, so the iterate obtained for a given k is the
+        # starting point of the level k + 1. Keeping this state across the
+        # calls to `run` allows solving only the new sparsity levels when the
+        # grid value increases.
+        self.path_w = np.zeros(self.X.shape[1])
+        self.path_k = -1
+        self.path_obj = np.inf
+        self.path_n_iter = 0
 
-    def run(self, grid_value):
-        # The grid_value parameter is the current entry in
-        # self.stopping_criterion.grid which is the amount of sparsity we
-        # target in the solution, i.e., the fraction of non-zero entries.
-        k = int(np.floor(grid_value * self.X.shape[1]))
+    def image(self, w, s):
+        # Image of a vector w supported on s, that is X @ w, or G @ w in Gram
+        # mode. Everything else is derived from it, and it is linear in w.
+        if self.use_gram:
+            return w[s] @ self.G[s]
+        return self.restricted_product(w, s)
 
-        w = np.zeros(self.X.shape[1])
-        old_obj = np.inf
-        for k_ws in range(k + 1):
+    def restricted_product(self, d, s):
+        # Product of X with the entries s of d, the other ones being ignored.
+        if self.matrix_free:
+            d_s = np.zeros(self.X.shape[1])
+            d_s[s] = d[s]
+            return self.X @ d_s
+        return self.X[:, s] @ d[s]
+
+    def gradient(self, Aw):
+        # Negative gradient X.T @ (y - X @ w) given the image of w.
+        if self.use_gram:
+            return self.Xty - Aw
+        return self.X.T @ (self.y - Aw)
+
+    def objective(self, w, s, Aw):
+        # Least-squares value 0.5 * ||y - X @ w||^2 given the image of w.
+        if self.use_gram:
+            return 0.5 * self.yty - w[s] @ (self.Xty[s] - 0.5 * Aw[s])
+        r = self.y - Aw
+        return 0.5 * (r @ r)
+
+    def sq_norm(self, d, s):
+        # Value of ||X @ d||^2 for a vector d supported on s.
+        if self.use_gram:
+            return d[s] @ self.G[np.ix_(s, s)] @ d[s]
+        Xd = self.restricted_product(d, s)
+        return Xd @ Xd
+
+    def normalized_step(self, w, s, grad, k):
+        # Gradient step of normalized IHT. The step size is exact for the
+        # least-squares restricted to the current support and it is reduced
+        # when the support changes and the step is too large.
+        supp = s if s.size > 0 else top_k(grad, k)
+        num = grad[supp] @ grad[supp]
+        den = self.sq_norm(grad, supp)
+        mu = num / den if den > 0.0 else 1.0 / self.L
+        while True:
+            z = w + mu * grad
+            s_new = top_k(z, k)
+            if np.array_equal(np.sort(s_new), np.sort(s)):
+                break
+            d = np.zeros(w.size)
+            d[s_new] = z[s_new]
+            d[s] -= w[s]
+            s_d = np.union1d(s, s_new)
+            omega = (1.0 - self.niht_c) * (d[s_d] @ d[s_d])
+            omega /= self.sq_norm(d, s_d)
+            if mu <= omega:
+                break
+            mu /= self.niht_kappa * (1.0 - self.niht_c)
+        return z, s_new
+
+    @cached_run
+    def run(self, k):
+        # The k parameter is the current entry in the grid of the stopping
+        # criterion, i.e., the number of non-zero entries targeted in the
+        # solution. When the criterion delivers the whole grid at once, k is
+        # a tuple and the solutions are stacked as the columns of w, with
+        # the number of iterations reached for each of them.
+        if np.ndim(k) == 0:
+            self.w, self.n_iter = self.solve(k)
+        else:
+            w, n_iter = zip(*[self.solve(k_i) for k_i in k])
+            self.w = np.stack(w, axis=1)
+            self.n_iter = list(n_iter)
+        self.k = k
+
+    def solve(self, k):
+        # The path can only be resumed towards larger sparsity levels.
+        if k < self.path_k:
+            self.reset_path()
+
+        w = self.path_w
+        old_obj = self.path_obj
+        n_iter = self.path_n_iter
+        for k_ws in range(self.path_k + 1, k + 1):
+            s = np.flatnonzero(w)
+            Aw = self.image(w, s)
+            w_prev, Aw_prev = np.copy(w), Aw
+            t = 1.0
             for _ in range(self.maxit):
-                r = self.y - self.X @ w
-                z = w + (self.X.T @ r) / self.L
-                s = np.argsort(np.abs(z))[::-1][:k_ws]
-                w = np.zeros(self.X.shape[1])
-                w[s] = z[s]
-                obj = 0.5 * (r @ r)
+                n_iter += 1
+                obj = self.objective(w, s, Aw)
+                if self.variant == "aiht":
+                    # Nesterov momentum on the iterates, restarted whenever
+                    # the objective increases.
+                    if obj > old_obj:
+                        t = 1.0
+                    t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t ** 2))
+                    beta = (t - 1.0) / t_next
+                    t = t_next
+                    v = w + beta * (w - w_prev)
+                    Av = Aw + beta * (Aw - Aw_prev)
+                    z = v + self.gradient(Av) / self.L
+                    s_new = top_k(z, k_ws)
+                elif self.variant == "niht":
+                    z, s_new = self.normalized_step(
+                        w, s, self.gradient(Aw), k_ws
+                    )
+                else:
+                    z = w + self.gradient(Aw) / self.L
+                    s_new = top_k(z, k_ws)
+                w_prev, w = w, w_prev
+                Aw_prev = Aw
+                w.fill(0.0)
+                w[s_new] = z[s_new]
+                s = s_new
+                Aw = self.image(w, s)
                 if (np.abs(old_obj - obj) / obj) < self.rel_tol:
                     break
                 old_obj = obj
 
+        self.path_w = w
+        self.path_k = k
+        self.path_obj = old_obj
+        self.path_n_iter = n_iter
+
         if self.debiasing_step:
-            if sum(w != 0) > 0:
-                XX = self.X[:, w != 0]
-                ww = lstsq(XX, self.y)
-                ww = ww[0]
-                w[w != 0] = ww
+            w = self.debiaser.debias(w)
+        else:
+            w = np.copy(w)
 
-        self.w = w
+        return w, n_iter
 
     def get_result(self):
-        return dict(w=self.w)
+        return dict(w=self.w, n_iter=self.n_iter, k=self.k)
@@ -1,44 +1,259 @@
 from benchopt import BaseSolver, safe_import_context
 from benchmark_utils.stopping_criterion import RunOnGridCriterion
+from benchmark_utils.result_cache import cached_run
 
 with safe_import_context() as import_ctx:
+    import time
     import numpy as np
-    from gurobipy import Model, GRB
+    from benchmark_utils.operators import as_matrix
+    from gurobipy import Model, GRB, quicksum
+    from scipy import sparse
+    from sklearn.linear_model import orthogonal_mp
+    from benchmark_utils.hashing import fingerprint
+
+
+_big_m_cache = {}
+
+
+def get_big_m(X, y):
+    """Per-coefficient big-M bounds, computed once per dataset.
+
+    The global bound M = 10 * ||pinv(X) @ y||_inf is tightened coefficient-wise
+    when X has full column rank. Any w such that ||y - X @ w|| <= ||y||, and
+    thus any optimal solution, satisfies ||X @ w|| <= 2 ||y||. Projecting X @ w
+    onto the orthogonal of the other columns of X gives
+    |w_i| <= 2 ||y|| sqrt([(X.T @ X)^{-1}]_ii).
+    """
+    key = fingerprint(X, y)
+    if key not in _big_m_cache:
+        n = X.shape[1]
+        w_ls, _, rank, _ = np.linalg.lstsq(X, y, rcond=None)
+        M = np.full(n, 10 * np.max(np.abs(w_ls)))
+        if rank == n:
+            G_inv_diag = np.diag(np.linalg.inv(X.T @ X))
+            M_i = 2 * np.linalg.norm(y) * np.sqrt(np.maximum(G_inv_diag, 0))
+            M = np.minimum(M, M_i)
+        _big_m_cache[key] = M
+    return _big_m_cache[key]
 
 
 class Solver(BaseSolver):
     name = "l0constraint"
-    stopping_criterion = RunOnGridCriterion(grid=np.linspace(0, 0.1, 10))
+    # The grid shared with the other solvers is refined with 4 more values of
+    # k around the support recovery transition.
+    stopping_criterion = RunOnGridCriterion(
+        grid=np.linspace(0, 0.1, 10), refine_budget=4
+    )
+    parameters = {
+        "formulation": ["bigm"],
+        "ridge": [1e-3],
+        "mip_start": ["omp"],
+        "time_limit": [None],
+        "time_budget": [None],
+        "threads": [0],
+    }
 
     install_cmd = "conda"
-    requirements = ["pip:gurobipy"]
+    requirements = ["pip:gurobipy", "scikit-learn"]
+
+    # The MIP start of the next grid value is restored on a cache hit.
+    cache_state = ("w_prev",)
+
+    def skip(self, X, y):
+        if sparse.issparse(X):
+            return True, "l0constraint does not support a sparse X"
+        return False, None
 
     def set_objective(self, X, y):
-        self.X = X
+        self.X = as_matrix(X)
         self.y = y
+        self.M = get_big_m(self.X, self.y)
+        if self.formulation not in ["bigm", "sos1", "perspective"]:
+            raise ValueError(f"Unknown formulation {self.formulation}")
+        if self.mip_start not in [None, "previous", "omp"]:
+            raise ValueError(f"Unknown mip_start {self.mip_start}")
 
-    def run(self, grid_value):
-        # The grid_value parameter is the current entry in
-        # self.stopping_criterion.grid which is the amount of sparsity we
-        # target in the solution, i.e., the fraction of non-zero entries.
-        k = int(np.floor(grid_value * self.X.shape[1]))
+        # The model is built once and reused across grid values, only the
+        # right-hand side of the cardinality constraint is modified.
+        self.model = None
+        self.w_prev = None
 
+        # The time budget is shared by all the grid values, starting at the
+        # first call to `run`.
+        self.deadline = None
+
+    def build_model(self):
+        # The support of w is modeled by the binary variables z, either with
+        # big-M constraints, with SOS1 constraints on the pairs (w_i, 1 - z_i)
+        # which need no bound on w, or with the perspective reformulation of
+        # a small ridge term ridge * sum_i w_i^2 / z_i, which also forces
+        # w_i = 0 when z_i = 0 and strengthens the continuous relaxation.
         n = self.X.shape[1]
-        M = 10 * np.max(np.abs(np.linalg.lstsq(self.X, self.y, rcond=None)[0]))
         model = Model()
-        w_var = model.addMVar(n, name="w", vtype="C", lb=-np.inf, ub=np.inf)
+        if self.formulation == "sos1":
+            lb, ub = -np.inf, np.inf
+        else:
+            lb, ub = -self.M, self.M
+        w_var = model.addMVar(n, name="w", vtype="C", lb=lb, ub=ub)
         z_var = model.addMVar(n, name="z", vtype="B")
         r_var = self.y - self.X @ w_var
-        model.setObjective(0.5 * (r_var @ r_var), GRB.MINIMIZE)
-        model.addConstr(w_var <= M * z_var)
-        model.addConstr(w_var >= -M * z_var)
-        model.addConstr(sum(z_var) <= k)
+        obj = 0.5 * (r_var @ r_var)
+        if self.formulation == "bigm":
+            M = sparse.diags(self.M)
+            model.addConstr(w_var <= M @ z_var)
+            model.addConstr(w_var >= -M @ z_var)
+        elif self.formulation == "sos1":
+            u_var = model.addMVar(n, name="u", vtype="C", lb=0.0, ub=1.0)
+            model.addConstr(u_var + z_var == 1)
+            for w_i, u_i in zip(w_var.tolist(), u_var.tolist()):
+                model.addSOS(GRB.SOS_TYPE1, [w_i, u_i])
+        elif self.formulation == "perspective":
+            # The ridge weight is relative to the mean squared column norm.
+            ridge = self.ridge * np.sum(self.X ** 2) / n
+            t_var = model.addMVar(n, name="t", vtype="C", lb=0.0, ub=np.inf)
+            for w_i, t_i, z_i in zip(
+                w_var.tolist(), t_var.tolist(), z_var.tolist()
+            ):
+                model.addConstr(w_i * w_i <= t_i * z_i)
+            obj += ridge * t_var.sum()
+        model.setObjective(obj, GRB.MINIMIZE)
+        self.card_constr = model.addConstr(quicksum(z_var.tolist()) <= 0)
         model.setParam("OutputFlag", 0)
         model.setParam("MIPGap", 1e-8)
         model.setParam("IntFeasTol", 1e-8)
-        model.optimize()
+        model.setParam("Threads", self.threads)
+        self.model = model
+        self.w_var = w_var
+        self.z_var = z_var
+
+    def get_mip_start(self, k):
+        # Candidate incumbents are the solution of the previous grid value,
+        # which remains feasible when k increases, and an OMP solution. They
+        # are clipped to the big-M bounds if any and the best one is returned.
+        candidates = []
+        if self.mip_start in ["previous", "omp"] and self.w_prev is not None:
+            if np.sum(self.w_prev != 0) <= k:
+                candidates.append(self.w_prev)
+        if self.mip_start == "omp" and k > 0:
+            candidates.append(
+                orthogonal_mp(
+                    self.X, self.y, n_nonzero_coefs=min(k, self.X.shape[1])
+                )
+            )
+        if len(candidates) == 0:
+            return None
+        if self.formulation != "sos1":
+            candidates = [np.clip(w, -self.M, self.M) for w in candidates]
+        values = [np.linalg.norm(self.y - self.X @ w) for w in candidates]
+        return candidates[np.argmin(values)]
+
+    def mip_callback(self, model, where):
+        # Record the incumbent value, the best bound and the gap each time
+        # one of them changes during the branch-and-bound.
+        if where == GRB.Callback.MIP:
+            obj = model.cbGet(GRB.Callback.MIP_OBJBST)
+            bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+        elif where == GRB.Callback.MIPSOL:
+            obj = model.cbGet(GRB.Callback.MIPSOL_OBJBST)
+            bound = model.cbGet(GRB.Callback.MIPSOL_OBJBND)
+        else:
+            return
+        if len(self.trace) > 0 and self.trace[-1][1:3] == (obj, bound):
+            return
+        runtime = model.cbGet(GRB.Callback.RUNTIME)
+        self.trace.append((runtime, obj, bound, self.compute_gap(obj, bound)))
+
+    @staticmethod
+    def compute_gap(obj, bound):
+        if obj >= GRB.INFINITY:
+            return np.inf
+        return abs(obj - bound) / max(abs(obj), 1e-10)
+
+    @cached_run
+    def run(self, k):
+        # The k parameter is the current entry in the grid of the stopping
+        # criterion, i.e., the number of non-zero entries targeted in the
+        # solution. When the criterion delivers the whole grid at once, k is
+        # a tuple, the solutions are stacked as the columns of w and the MIP
+        # information is reported for each of them.
+        if np.ndim(k) == 0:
+            result = self.solve(k)
+        else:
+            results = [self.solve(k_i) for k_i in k]
+            result = {key: [r[key] for r in results] for key in results[0]}
+            result["w"] = np.stack(result["w"], axis=1)
+        for key, val in result.items():
+            setattr(self, key, val)
+        self.k = k
+
+    def solve(self, k):
+        if self.model is None:
+            self.build_model()
+        self.card_constr.RHS = k
+
+        n = self.X.shape[1]
+        w_start = self.get_mip_start(k)
+        if w_start is None:
+            self.w_var.Start = np.full(n, GRB.UNDEFINED)
+            self.z_var.Start = np.full(n, GRB.UNDEFINED)
+        else:
+            self.w_var.Start = w_start
+            self.z_var.Start = (w_start != 0).astype(float)
+
+        time_limit = np.inf if self.time_limit is None else self.time_limit
+        if self.time_budget is not None:
+            if self.deadline is None:
+                self.deadline = time.perf_counter() + self.time_budget
+            time_limit = min(time_limit, self.deadline - time.perf_counter())
+
+        # The trace holds (runtime, incumbent, bound, gap) tuples. When the
+        # time budget is exhausted, the MIP is not solved and the trivial
+        # bound 0 is reported for the MIP start.
+        self.trace = []
+        if time_limit > 0:
+            self.model.setParam("TimeLimit", min(time_limit, GRB.INFINITY))
+            self.model.optimize(self.mip_callback)
+            mip_bound = self.model.ObjBound
+            mip_runtime = self.model.Runtime
+        else:
+            mip_bound = 0.0
+            mip_runtime = 0.0
+
+        # Without any feasible solution found within the time limit, the
+        # MIP start is returned.
+        if time_limit > 0 and self.model.SolCount > 0:
+            w = self.w_var.X * (self.z_var.X > 0.5)
+            obj = self.model.ObjVal
+        else:
+            w = np.zeros(n) if w_start is None else w_start
+            obj = 0.5 * np.linalg.norm(self.y - self.X @ w) ** 2
+        mip_gap = self.compute_gap(obj, mip_bound)
+        self.trace.append((mip_runtime, obj, mip_bound, mip_gap))
+        self.w_prev = w
 
-        self.w = w_var.X * (z_var.X > 0.5)
+        # The trace of the MIP solved for k is reported with the result, as
+        # one array per recorded quantity.
+        trace = np.array(self.trace)
+        return dict(
+            w=w,
+            mip_bound=mip_bound,
+            mip_gap=mip_gap,
+            mip_runtime=mip_runtime,
+            mip_trace_runtime=trace[:, 0],
+            mip_trace_obj=trace[:, 1],
+            mip_trace_bound=trace[:, 2],
+            mip_trace_gap=trace[:, 3],
+        )
 
     def get_result(self):
-        return dict(w=self.w)
+        return dict(
+            w=self.w,
+            k=self.k,
+            mip_bound=self.mip_bound,
+            mip_gap=self.mip_gap,
+            mip_runtime=self.mip_runtime,
+            mip_trace_runtime=self.mip_trace_runtime,
+            mip_trace_obj=self.mip_trace_obj,
+            mip_trace_bound=self.mip_trace_bound,
+            mip_trace_gap=self.mip_trace_gap,
+        )
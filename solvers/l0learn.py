@@ -1,16 +1,23 @@
 from benchopt import BaseSolver, safe_import_context
 from benchmark_utils.stopping_criterion import RunOnGridCriterion
+from benchmark_utils.result_cache import cached_run
 
 with safe_import_context() as import_ctx:
     import numpy as np
+    from benchmark_utils.operators import as_matrix
     import warnings
-    from scipy.linalg import lstsq
+    from scipy import sparse
+    from benchmark_utils.debiasing import get_debiaser
     import l0learn
 
 
 class Solver(BaseSolver):
     name = "l0learn"
-    stopping_criterion = RunOnGridCriterion(grid=np.linspace(0, 0.1, 10))
+    # The grid shared with the other solvers is refined with 4 more values of
+    # k around the support recovery transition.
+    stopping_criterion = RunOnGridCriterion(
+        grid=np.linspace(0, 0.1, 10), refine_budget=4
+    )
     parameters = {
         "debiasing_step": [False, True],
     }
@@ -18,15 +25,20 @@ class Solver(BaseSolver):
     requirements = ["pip:l0learn"]
 
     def set_objective(self, X, y):
-        self.X = X
+        self.X = as_matrix(X, accept_sparse=True)
         self.y = y
+        if self.debiasing_step:
+            self.debiaser = get_debiaser(self.X, self.y)
+        self.path_k = -1
 
-    def run(self, grid_value):
-        # The grid_value parameter is the current entry in
-        # self.stopping_criterion.grid which is the amount of sparsity we
-        # target in the solution, i.e., the fraction of non-zero entries.
-        k = int(np.floor(grid_value * self.X.shape[1]))
-
+    def compute_path(self, k):
+        # L0learn fits a regularization path. It is fitted once with the
+        # largest support size needed by the grid and all the solutions of
+        # the path are stored as the columns of a sparse matrix, together
+        # with their support size and cross-validation error.
+        n = self.X.shape[1]
+        k_max = self.stopping_criterion.k_grid(n).max()
+        k_max = max(k, k_max)
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             fit_result = l0learn.cvfit(
@@ -35,32 +47,52 @@ class Solver(BaseSolver):
                 loss="SquaredError",
                 penalty="L0",
                 intercept=False,
-                max_support_size=k + 1,
+                max_support_size=k_max + 1,
             )
 
-        # L0learn fits a regularization path. We return the best k-sparse
-        # solution among the path with respect to the cross-validation error
-        # computed on the least-squares term.
-        best_w = np.zeros(self.X.shape[1])
-        best_cv = np.inf
-        for i, gamma in enumerate(fit_result.gamma):
-            for j, lmbda in enumerate(fit_result.lambda_0[i]):
-                if fit_result.cv_means[i][j]:
-                    w = fit_result.coeff(lmbda, gamma)
-                    w = np.array(w.todense()).reshape(w.shape[0])[1:]
-                    if np.linalg.norm(w, 0) <= k:
-                        if fit_result.cv_means[i][j] < best_cv:
-                            best_cv = fit_result.cv_means[i][j]
-                            best_w = np.copy(w)
+        # The last n rows skip the intercept row, if any.
+        coef_path = sparse.hstack(fit_result.coeffs).tocsr()[-n:].tocsc()
+        coef_path.eliminate_zeros()
+        self.coef_path = coef_path
+        self.nnz_path = np.diff(coef_path.indptr)
+        self.cv_path = np.concatenate(
+            [np.ravel(cv_means) for cv_means in fit_result.cv_means]
+        )
+        self.path_k = k_max
+
+    @cached_run
+    def run(self, k):
+        # The k parameter is the current entry in the grid of the stopping
+        # criterion, i.e., the number of non-zero entries targeted in the
+        # solution. When the criterion delivers the whole grid at once, k is
+        # a tuple and the solutions are stacked as the columns of w.
+        if np.ndim(k) == 0:
+            self.w = self.solve(k)
+        else:
+            self.w = np.stack([self.solve(k_i) for k_i in k], axis=1)
+        self.k = k
+
+    def solve(self, k):
+        if k > self.path_k:
+            self.compute_path(k)
+
+        # We return the best k-sparse solution among the path with respect to
+        # the cross-validation error computed on the least-squares term.
+        candidates = np.flatnonzero(
+            (self.nnz_path <= k)
+            & (self.cv_path != 0.0)
+            & ~np.isnan(self.cv_path)
+        )
+        if candidates.size > 0:
+            best = candidates[np.argmin(self.cv_path[candidates])]
+            best_w = self.coef_path[:, best].toarray().ravel()
+        else:
+            best_w = np.zeros(self.X.shape[1])
 
         if self.debiasing_step:
-            if sum(w != 0) > 0:
-                XX = self.X[:, w != 0]
-                ww = lstsq(XX, self.y)
-                ww = ww[0]
-                w[w != 0] = ww
+            best_w = self.debiaser.debias(best_w)
 
-        self.w = best_w
+        return best_w
 
     def get_result(self):
-        return dict(w=self.w)
+        return dict(w=self.w, k=self.k)
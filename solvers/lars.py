@@ -1,11 +1,14 @@
 from benchopt import BaseSolver, safe_import_context
 from benchmark_utils.stopping_criterion import RunOnGridCriterion
+from benchmark_utils.result_cache import cached_run
 
 with safe_import_context() as import_ctx:
     import numpy as np
+    from benchmark_utils.operators import as_matrix
+    from scipy import sparse
     import warnings
     from sklearn.linear_model import Lars
-    from scipy.linalg import lstsq
+    from benchmark_utils.debiasing import get_debiaser
 
 
 class Solver(BaseSolver):
@@ -17,33 +20,54 @@ class Solver(BaseSolver):
     install_cmd = "conda"
     requirements = ["scikit-learn", "scipy"]
 
+    def skip(self, X, y):
+        if sparse.issparse(X):
+            return True, "lars does not support a sparse X"
+        return False, None
+
     def set_objective(self, X, y):
-        self.X = X
+        self.X = as_matrix(X)
         self.y = y
+        if self.debiasing_step:
+            self.debiaser = get_debiaser(self.X, self.y)
+        self.path_k = 0
+        self.coef_path = np.zeros((self.X.shape[1], 1))
 
-    def run(self, grid_value):
-        # The grid_value parameter is the current entry in
-        # self.stopping_criterion.grid which is the amount of sparsity we
-        # target in the solution, i.e., the fraction of non-zero entries.
-        k = int(np.floor(grid_value * self.X.shape[1]))
+    def compute_path(self, k):
+        # LARS adds one variable at each step, so the solution with k
+        # non-zeros is the k-th step of the path. The path is computed once
+        # up to the largest k of the grid and then sliced for each grid value.
+        n = self.X.shape[1]
+        k_max = self.stopping_criterion.k_grid(n).max()
+        k_max = max(k, k_max)
+        solver = Lars(n_nonzero_coefs=k_max, fit_intercept=False)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            solver.fit(self.X, self.y)
+        self.coef_path = solver.coef_path_
+        self.path_k = k_max
 
-        if k == 0:
-            w = np.zeros(self.X.shape[1])
+    @cached_run
+    def run(self, k):
+        # The k parameter is the current entry in the grid of the stopping
+        # criterion, i.e., the number of non-zero entries targeted in the
+        # solution. When the criterion delivers the whole grid at once, k is
+        # a tuple and the solutions are stacked as the columns of w.
+        if np.ndim(k) == 0:
+            self.w = self.solve(k)
         else:
-            solver = Lars(n_nonzero_coefs=k, fit_intercept=False)
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                solver.fit(self.X, self.y)
-            w = solver.coef_.flatten()
+            self.w = np.stack([self.solve(k_i) for k_i in k], axis=1)
+        self.k = k
+
+    def solve(self, k):
+        if k > self.path_k:
+            self.compute_path(k)
+        w = np.copy(self.coef_path[:, min(k, self.coef_path.shape[1] - 1)])
 
         if self.debiasing_step:
-            if sum(w != 0) > 0:
-                XX = self.X[:, w != 0]
-                ww = lstsq(XX, self.y)
-                ww = ww[0]
-                w[w != 0] = ww
+            w = self.debiaser.debias(w)
 
-        self.w = w
+        return w
 
     def get_result(self):
-        return dict(w=self.w)
+        return dict(w=self.w, k=self.k)
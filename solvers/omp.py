@@ -1,40 +1,90 @@
 from benchopt import BaseSolver, safe_import_context
 from benchmark_utils.stopping_criterion import RunOnGridCriterion
+from benchmark_utils.result_cache import cached_run
 
 with safe_import_context() as import_ctx:
     import numpy as np
+    from benchmark_utils.operators import as_matrix
     import warnings
-    from sklearn.linear_model import OrthogonalMatchingPursuit
+    from scipy import sparse
+    from sklearn.linear_model import orthogonal_mp, orthogonal_mp_gram
 
 
 class Solver(BaseSolver):
     name = "omp"
     stopping_criterion = RunOnGridCriterion(grid=np.linspace(0, 0.1, 10))
+    parameters = {
+        "gram": ["auto"],
+    }
     install_cmd = "conda"
     requirements = ["scikit-learn"]
 
     def set_objective(self, X, y):
-        self.X = X
+        self.X = as_matrix(X, accept_sparse=True)
         self.y = y
 
-    def run(self, grid_value):
-        # The grid_value parameter is the current entry in
-        # self.stopping_criterion.grid which is the amount of sparsity we
-        # target in the solution, i.e., the fraction of non-zero entries.
-        k = int(np.floor(grid_value * self.X.shape[1]))
+        # In Gram mode, OMP only involves X.T @ X and X.T @ y which are
+        # computed once. This is cheaper when n_samples >= n_features, and
+        # it is always used for a sparse X as OMP needs dense arrays.
+        # The gram parameter is a string when it is set from the command line.
+        if str(self.gram) not in ["auto", "True", "False"]:
+            raise ValueError(f"Unknown gram {self.gram}")
+        if sparse.issparse(self.X):
+            self.use_gram = True
+        elif str(self.gram) == "auto":
+            self.use_gram = self.X.shape[0] >= self.X.shape[1]
+        else:
+            self.use_gram = str(self.gram) == "True"
+        if self.use_gram:
+            self.G = self.X.T @ self.X
+            if sparse.issparse(self.G):
+                self.G = self.G.toarray()
+            self.Xty = self.X.T @ self.y
+
+        self.path_k = 0
+        self.coef_path = np.zeros((self.X.shape[1], 0))
+
+    def compute_path(self, k):
+        # OMP adds one atom at each step, so the solution with k non-zeros is
+        # the k-th step of the path. The path is computed once up to the
+        # largest k of the grid and then sliced for each grid value.
+        n = self.X.shape[1]
+        k_max = self.stopping_criterion.k_grid(n).max()
+        k_max = min(max(k, k_max), n)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            if self.use_gram:
+                coef_path = orthogonal_mp_gram(
+                    self.G, self.Xty, n_nonzero_coefs=k_max, return_path=True
+                )
+            else:
+                coef_path = orthogonal_mp(
+                    self.X, self.y, n_nonzero_coefs=k_max, return_path=True
+                )
+        self.coef_path = coef_path.reshape(n, -1)
+        self.path_k = k_max
+
+    @cached_run
+    def run(self, k):
+        # The k parameter is the current entry in the grid of the stopping
+        # criterion, i.e., the number of non-zero entries targeted in the
+        # solution. When the criterion delivers the whole grid at once, k is
+        # a tuple and the solutions are stacked as the columns of w.
+        if np.ndim(k) == 0:
+            self.w = self.solve(k)
+        else:
+            self.w = np.stack([self.solve(k_i) for k_i in k], axis=1)
+        self.k = k
 
+    def solve(self, k):
         if k == 0:
             w = np.zeros(self.X.shape[1])
         else:
-            solver = OrthogonalMatchingPursuit(
-                n_nonzero_coefs=k, fit_intercept=False
-            )
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                solver.fit(self.X, self.y)
-            w = solver.coef_.flatten()
+            if k > self.path_k:
+                self.compute_path(k)
+            w = np.copy(self.coef_path[:, min(k, self.coef_path.shape[1]) - 1])
 
-        self.w = w
+        return w
 
     def get_result(self):
-        return dict(w=self.w)
+        return dict(w=self.w, k=self.k)
@@ -1,9 +1,11 @@
 from benchopt import BaseSolver, safe_import_context
 from benchmark_utils.stopping_criterion import RunOnGridCriterion
+from benchmark_utils.result_cache import cached_run
 
 with safe_import_context() as import_ctx:
     import numpy as np
-    from scipy.linalg import lstsq
+    from benchmark_utils.operators import as_matrix
+    from benchmark_utils.debiasing import get_debiaser
     from skglm import Lasso, ElasticNet, MCPRegression
 
 
@@ -15,13 +17,24 @@ class Solver(BaseSolver):
         "max_iter": [1_000],
         "alphaNum": [1_000],
         "alphaRatio": [1e-10],
+        "search": ["path"],
+        "log_scale": [True],
+        "bisection_tol": [1e-2],
+        "max_fits": [50],
         "debiasing_step": [False, True],
     }
     install_cmd = "conda"
     requirements = ["pip:skglm", "scipy"]
 
+    # Ratio between the successive alphas fitted by the bisection search
+    # while looking for a solution with more than k non-zeros.
+    bracket_factor = 10.0
+
+    # The fits shared by the grid values are restored on a cache hit.
+    cache_state = ("path_alpha", "path_supp", "path_vals", "path_nnz")
+
     def set_objective(self, X, y):
-        self.X = X
+        self.X = as_matrix(X, accept_sparse=True)
         self.y = y
         self.alphaMax = np.linalg.norm(self.X.T @ self.y, np.inf) / y.size
         self.alphaMin = self.alphaRatio * self.alphaMax
@@ -31,42 +44,144 @@ class Solver(BaseSolver):
             self.alphaNum,
         )
 
-    def run(self, grid_value):
-        # The grid_value parameter is the current entry in
-        # self.stopping_criterion.grid which is the amount of sparsity we
-        # target in the solution, i.e., the fraction of non-zero entries.
-        k = int(np.floor(grid_value * self.X.shape[1]))
-
         if self.estimator == "lasso":
-            solver_class = Lasso
+            self.solver_class = Lasso
         elif self.estimator == "enet":
-            solver_class = ElasticNet
+            self.solver_class = ElasticNet
             self.alphaGrid *= 2.0
         elif self.estimator == "mcp":
-            solver_class = MCPRegression
+            self.solver_class = MCPRegression
         else:
             raise ValueError(f"Unknown estimator {self.estimator}")
+        if self.search not in ["path", "bisection"]:
+            raise ValueError(f"Unknown search {self.search}")
+
+        if self.debiasing_step:
+            self.debiaser = get_debiaser(self.X, self.y)
+
+        self.reset_path()
+
+    def reset_path(self):
+        # The solutions computed along alphaGrid ("path" search) or at the
+        # alphas visited by the bisections ("bisection" search) are shared by
+        # all the grid values. Each fit is warm-started and the solutions are
+        # stored in sparse form together with their alpha and support size,
+        # from which the warm starts are rebuilt.
+        self.path_solver = self.solver_class(
+            alpha=self.alphaGrid[0],
+            max_iter=self.max_iter,
+            fit_intercept=False,
+            warm_start=True,
+        )
+        self.path_alpha = []
+        self.path_supp = []
+        self.path_vals = []
+        self.path_nnz = []
+
+    def fit_alpha(self, alpha, w_init=None):
+        self.path_solver.alpha = alpha
+        if w_init is not None:
+            self.path_solver.coef_ = np.copy(w_init)
+        self.path_solver.fit(self.X, self.y)
+        w = self.path_solver.coef_.flatten()
+        s = np.flatnonzero(w)
+        self.path_alpha.append(alpha)
+        self.path_supp.append(s)
+        self.path_vals.append(w[s])
+        self.path_nnz.append(s.size)
 
+    def path_w(self, i):
         w = np.zeros(self.X.shape[1])
-        for alpha in self.alphaGrid:
-            w_old = w
-            solver = solver_class(
-                alpha=alpha, max_iter=self.max_iter, fit_intercept=False
-            )
-            solver.fit(self.X, self.y)
-            w = solver.coef_.flatten()
-            if np.sum(w != 0) > k:
-                w = w_old
+        if i >= 0:
+            w[self.path_supp[i]] = self.path_vals[i]
+        return w
+
+    def extend_path(self, k):
+        # Fit the next alphas of the path until a solution with more than k
+        # non-zeros is found or until the path is exhausted.
+        while len(self.path_nnz) < self.alphaNum and (
+            len(self.path_nnz) == 0 or max(self.path_nnz) <= k
+        ):
+            i = len(self.path_nnz)
+            self.fit_alpha(self.alphaGrid[i], self.path_w(i - 1))
+
+    def search_path(self, k):
+        # Return the last solution of the path before the first one with
+        # more than k non-zeros.
+        self.extend_path(k)
+        exceed = np.flatnonzero(np.array(self.path_nnz) > k)
+        i = exceed[0] - 1 if exceed.size > 0 else len(self.path_nnz) - 1
+        return self.path_w(i)
+
+    def search_bisection(self, k):
+        # Bisect on alpha between the smallest alpha with at most k non-zeros
+        # and the largest smaller alpha with more than k non-zeros, reusing
+        # the solutions visited for the previous grid values. When no such
+        # smaller alpha has been fitted yet, the lower end of the bracket is
+        # searched by dividing alpha by bracket_factor, as the fits get more
+        # expensive when alpha decreases. The bisection stops when a k-sparse
+        # solution is found, when the bracket is narrower than bisection_tol
+        # or after max_fits solver calls.
+        alphaMax, alphaMin = self.alphaGrid[0], self.alphaGrid[-1]
+        if len(self.path_alpha) == 0:
+            self.fit_alpha(alphaMax, np.zeros(self.X.shape[1]))
+        n_fits = 0
+        while True:
+            alpha = np.array(self.path_alpha)
+            nnz = np.array(self.path_nnz)
+            i_hi = np.flatnonzero(nnz <= k)
+            i_hi = i_hi[np.argmin(alpha[i_hi])]
+            if nnz[i_hi] == k or n_fits >= self.max_fits:
                 break
+            i_lo = np.flatnonzero(alpha < alpha[i_hi])
+            if i_lo.size == 0:
+                if alpha[i_hi] <= alphaMin:
+                    break
+                alpha_next = max(alpha[i_hi] / self.bracket_factor, alphaMin)
+                self.fit_alpha(alpha_next, self.path_w(i_hi))
+                n_fits += 1
+                continue
+            i_lo = i_lo[np.argmax(alpha[i_lo])]
+            alpha_hi, alpha_lo = alpha[i_hi], alpha[i_lo]
+            if alpha_hi / alpha_lo - 1.0 < self.bisection_tol:
+                break
+            if self.log_scale:
+                alpha_mid = np.sqrt(alpha_lo * alpha_hi)
+            else:
+                alpha_mid = 0.5 * (alpha_lo + alpha_hi)
+            self.fit_alpha(alpha_mid, self.path_w(i_hi))
+            n_fits += 1
+
+        # Largest support with at most k non-zeros, ties being broken in
+        # favor of the smallest alpha.
+        alpha = np.array(self.path_alpha)
+        nnz = np.array(self.path_nnz)
+        candidates = np.flatnonzero(nnz <= k)
+        i = candidates[np.lexsort((alpha[candidates], -nnz[candidates]))[0]]
+        return self.path_w(i)
+
+    @cached_run
+    def run(self, k):
+        # The k parameter is the current entry in the grid of the stopping
+        # criterion, i.e., the number of non-zero entries targeted in the
+        # solution. When the criterion delivers the whole grid at once, k is
+        # a tuple and the solutions are stacked as the columns of w.
+        if np.ndim(k) == 0:
+            self.w = self.solve(k)
+        else:
+            self.w = np.stack([self.solve(k_i) for k_i in k], axis=1)
+        self.k = k
+
+    def solve(self, k):
+        if self.search == "path":
+            w = self.search_path(k)
+        else:
+            w = self.search_bisection(k)
 
         if self.debiasing_step:
-            if sum(w != 0) > 0:
-                XX = self.X[:, w != 0]
-                ww = lstsq(XX, self.y)
-                ww = ww[0]
-                w[w != 0] = ww
+            w = self.debiaser.debias(w)
 
-        self.w = w
+        return w
 
     def get_result(self):
-        return dict(w=self.w)
+        return dict(w=self.w, k=self.k)